@@ -8,12 +8,14 @@
 #
 # SECTION: MODULE IMPORTS
 #
+import os
 import platform
 
 #
 # SECTION: DEFINE EXTERNAL INTERFACE
 #
-__all__ = ["CONFIG_FILE", "DB_STR"]
+__all__ = ["CONFIG_FILE", "DB_STR", "CACHE_MAX_BYTES", "CACHE_TTL",
+           "MATERIAL_DIR"]
 
 # 配置文件所在路径
 if platform.system() == "Windows":
@@ -26,4 +28,12 @@ DB_STR = {
     'password': 'leon',
     'host': '192.168.1.11',
     'database': 'stockdata'
-}
\ No newline at end of file
+}
+
+# 进程内数据对象缓存的内存预算 (字节) 和过期时间 (秒)
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_TTL = 3600
+
+# 预先计算的市值序列的存储目录
+MATERIAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "materialized")
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+#
+#   pytest 配置。etl/test_tdx_file1.py 是在导入时就读取本地通达信文件的检验
+#   工具, 不是测试模块, 不收集。
+#
+collect_ignore = ["etl/test_tdx_file1.py"]
@@ -0,0 +1,179 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+# 本文件包含进程内的数据对象缓存, 包含:
+#
+#       ObjectCache
+#
+#   缓存以 (code, type) 为键保存已经从数据库读取的数据对象, 按 LRU 顺序在
+#   超出内存预算时淘汰, 同时每个对象有 TTL 过期时间。并发请求同一个键时只有
+#   一个线程真正去数据库读取 (single-flight), 其余线程等待其结果。读取期间
+#   invalidate 会增加该键的版本号, 版本号改变时读到的对象可能是失效前的数据,
+#   因此不放入缓存。
+#
+""" Process-wide LRU/TTL cache for loaded data objects. """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from config import *
+
+#
+# SECTION: DEFINE EXTERNAL INTERFACE
+#
+__all__ = ['ObjectCache', 'est_size']
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+# est_size
+#
+#   粗略估算一个数据对象占用的内存, 只计算 data 属性中的二维列表, 其他属性
+#   相对数据本身可以忽略。
+#
+def est_size(obj):
+    """ Return estimated memory size of a data object in bytes. """
+    data = getattr(obj, "data", [])
+    size = sys.getsizeof(obj) + sys.getsizeof(data)
+    for rec in data:
+        size += sys.getsizeof(rec) + sum(sys.getsizeof(v) for v in rec)
+    return size
+
+
+#
+# SECTION: CLASS DEFINATION
+#
+# _LoadSlot
+#
+#   正在进行的一次读取, 等待的线程从这里直接取得读取结果, 即使对象因超出
+#   预算没有被缓存, 也不必各自重新读取。
+#
+class _LoadSlot:
+    """ Result slot of one in-flight load shared with waiting threads. """
+
+    def __init__(self):
+        super().__init__()
+        self.event = threading.Event()
+        self.obj = None
+        self.ok = False  # 读取成功且未被 invalidate 时为真
+
+
+#
+# ObjectCache
+#
+#   线程安全的对象缓存.
+#       属性:
+#           max_bytes       内存预算, 超出时按 LRU 顺序淘汰
+#           ttl             对象的有效时间 (秒), 为 None 时永不过期
+#           used            当前缓存对象的估算内存合计
+#       方法:
+#           get             取得对象, 不存在时调用 loader 读取
+#           invalidate      使某个代码的对象失效
+#           clear           清空缓存
+#
+class ObjectCache:
+    """ LRU cache bounded by memory budget, with TTL and single-flight. """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL,
+                 sizeof=est_size):
+        super().__init__()
+        # 类属性定义部分
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.used = 0
+        self._sizeof = sizeof
+        self._items = OrderedDict()  # key -> [obj, size, expire]
+        self._loading = {}  # key -> _LoadSlot
+        self._gens = {}  # key -> 版本号, 读取中被 invalidate 时加一
+        self._lock = threading.Lock()
+        self.log = logging.getLogger("DEBUG")
+
+    def get(self, key, loader):
+        """ Return cached object of key, call loader() when missed. """
+        while True:
+            with self._lock:
+                entry = self._items.get(key)
+                if entry is not None:
+                    if entry[2] is None or entry[2] > time.monotonic():
+                        self._items.move_to_end(key)
+                        return entry[0]
+                    # 已过期, 删除后重新读取
+                    self._drop(key)
+                slot = self._loading.get(key)
+                if slot is None:
+                    # 本线程负责读取
+                    slot = self._loading[key] = _LoadSlot()
+                    break
+            # 其他线程正在读取, 等待其结束后直接使用其结果。
+            # 如果读取失败或被 invalidate, 下一轮循环中本线程会接手读取。
+            slot.event.wait()
+            if slot.ok: return slot.obj
+
+        try:
+            obj = loader()
+        except BaseException:
+            with self._lock:
+                del self._loading[key]
+                self._gens.pop(key, None)
+            slot.event.set()
+            raise
+        with self._lock:
+            del self._loading[key]
+            # 读取期间被 invalidate 过, 对象可能已过时, 不放入缓存, 也不交给
+            # 等待的线程。读取结束后计数不再需要, 删除以免字典增长。
+            if self._gens.pop(key, 0) == 0:
+                self._store(key, obj)
+                slot.obj, slot.ok = obj, True
+        slot.event.set()
+        return obj
+
+    def invalidate(self, code, type_=None):
+        """ Drop cached objects of code, or only (code, type_). """
+        match = lambda k: k[0] == code and (type_ is None or k[1] == type_)
+        with self._lock:
+            keys = [k for k in self._items if match(k)]
+            for k in keys: self._drop(k)
+            # 正在读取的键也要改变版本号, 使其结果不被缓存
+            for k in self._loading:
+                if match(k): self._gens[k] = self._gens.get(k, 0) + 1
+        if len(keys) > 0:
+            self.log.info("%d cached objects of %s invalidated." %
+                          (len(keys), code))
+
+    def clear(self):
+        """ Drop all cached objects. """
+        with self._lock:
+            self._items.clear()
+            self.used = 0
+
+    def _store(self, key, obj):
+        """ Put object to cache and evict LRU ones over budget. """
+        # 调用者必须持有 self._lock
+        size = self._sizeof(obj)
+        # 单个对象超过预算时不缓存
+        if size > self.max_bytes: return
+        if key in self._items: self._drop(key)
+        expire = None if self.ttl is None else time.monotonic() + self.ttl
+        self._items[key] = [obj, size, expire]
+        self.used += size
+        while self.used > self.max_bytes:
+            self._drop(next(iter(self._items)))
+
+    def _drop(self, key):
+        """ Remove one key from cache. """
+        # 调用者必须持有 self._lock
+        entry = self._items.pop(key)
+        self.used -= entry[1]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
@@ -16,18 +16,29 @@ from decimal import Decimal
 
 import mysql.connector
 
-import etl.stdzn
 from config import *
+from data.cache import ObjectCache
 
 #
 # SECTION: DEFINE EXTERNAL INTERFACE
 #
-__all__ = ['NumExtDataPiece', 'NumExtDataPiece']
+__all__ = ['NumExtData', 'CaptitalStructureData', 'clear_cache',
+           'iter_num_ext_data', 'ext_data_class']
 
 #
 # SECTION: GLOBAL VAIRABLE DEFINATION
 #
-_word_stdnz = etl.stdzn.WordSTDZN()
+# 进程内数据对象缓存, 键为 (code, type)
+_obj_cache = ObjectCache(CACHE_MAX_BYTES, CACHE_TTL)
+# 流式读取 num_extend_data 时可选的字段, 及其转换为数组时的 NumPy 类型和
+# 数据库中 NULL 对应的值
+_NUM_EXT_FIELDS = {
+    'code': ('U6', ''),
+    'type': ('U4', ''),
+    'item': ('U10', ''),
+    'date': ('datetime64[D]', 'NaT'),
+    'value': ('f8', float('nan')),
+}
 
 
 #
@@ -55,6 +66,90 @@ def _assorted_max(lst2d, val_idx):
     return idx
 
 
+#
+# clear_cache
+#
+#   清空进程内的数据对象缓存, 主要用于测试或长时间运行的任务。
+#
+def clear_cache():
+    """ Drop all cached data objects. """
+    _obj_cache.clear()
+
+
+#
+# _rows_to_array
+#
+#   将数据行转换为 NumPy 结构化数组。NULL 必须先替换, 否则字符串字段会得到
+#   'None', 数值字段会出错。
+#
+def _rows_to_array(rows, fields):
+    """ Return NumPy structured array of rows, NULL mapped per field. """
+    import numpy
+    dtype = [(f, _NUM_EXT_FIELDS[f][0]) for f in fields]
+    nulls = [_NUM_EXT_FIELDS[f][1] for f in fields]
+    return numpy.array(
+        [tuple(n if v is None else v for v, n in zip(r, nulls))
+         for r in rows], dtype=dtype)
+
+
+#
+# iter_num_ext_data
+#
+#   以流式方式读取 num_extend_data 表。使用非缓冲游标, 数据留在服务器端,
+#   每次用 fetchmany 取出 chunk_size 行, 因此扫描全表也只占用固定内存。
+#   code 和 type_ 为 None 时不做过滤。as_array 为真时每块数据转换为 NumPy
+#   结构化数组 (NULL 字符串为 '', NULL 数值为 NaN), 否则为
+#   [[字段值, ...], ...] 形式的列表。
+#
+def iter_num_ext_data(code=None, type_=None, chunk_size=10000,
+                      fields=('item', 'date', 'value'), as_array=False):
+    """ Yield chunks of rows from num_extend_data with constant memory. """
+
+    if chunk_size <= 0: raise ValueError("Chunk size must be positive!")
+    for f in fields:
+        if f not in _NUM_EXT_FIELDS: raise ValueError("Wrong field: %s" % f)
+    # 生成查询语句
+    conds, args = [], []
+    if code is not None:
+        conds.append("code = %s")
+        args.append(code)
+    if type_ is not None:
+        conds.append("type = %s")
+        args.append(type_)
+    sql = "SELECT %s FROM num_extend_data" % ", ".join(fields)
+    if len(conds) > 0: sql += " WHERE " + " AND ".join(conds)
+    db_conn = mysql.connector.connect(**DB_STR)
+    try:
+        cursor = db_conn.cursor(buffered=False)
+        cursor.execute(sql, tuple(args))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if len(rows) == 0: break
+            if as_array:
+                yield _rows_to_array(rows, fields)
+            else:
+                yield [list(r) for r in rows]
+    finally:
+        # 提前结束迭代时游标中仍有未读数据, 直接断开连接即可丢弃。
+        db_conn.close()
+
+
+#
+# ext_data_class
+#
+#   按数据类型找到对应的 NumExtData 子类, 用于按抽取规格的目标数据类型创建
+#   数据对象。
+#
+def ext_data_class(data_type):
+    """ Return the NumExtData subclass storing data_type. """
+    classes = [NumExtData]
+    while classes:
+        cls = classes.pop()
+        if cls.data_type == data_type and cls.data_type != "": return cls
+        classes.extend(cls.__subclasses__())
+    raise ValueError("No data class for type: %s" % data_type)
+
+
 #
 # SECTION: CLASS DEFINATION
 #
@@ -88,6 +183,7 @@ class ExtDataPiece:
 #           insert_idx      指向非本地数据的索引，即需要上传到数据库的。
 #           update_idx      指向已变更数据的索引，需要在数据库中更新。
 #       方法:
+#           cached          类方法, 从进程内缓存取得数据对象
 #           _read_from_db   从数据库中读取数据
 #           dump_all        输出全部数据，调试用
 #           dump_now        输出最新数据，调试用
@@ -95,15 +191,32 @@ class ExtDataPiece:
 class NumExtData(ExtDataPiece):
     """ Extend ExtDataPiece to store numberic data. """
     #
+    # 数据类型, 由子类定义, 同时作为缓存键的一部分
+    data_type = ""
+
     # 用来提供数据库表 num_extend_data
     def __init__(self, code):
         super().__init__()
         # 类属性定义部分
         self.code = code
-        self.type = self.table = ""
+        self.type = self.data_type
+        self.table = ""
         self.data = []
-        self.index = self.recent = {}
-        self.insert_idx = self.update_idx = []
+        self.index = {}
+        self.recent = {}
+        self.insert_idx = []
+        self.update_idx = []
+
+    @classmethod
+    def cached(cls, code):
+        """ Return shared data object of code from process-wide cache.
+
+        Concurrent calls for the same code share one database query,
+        the object is dropped when update_database commits its changes.
+        The object is shared and read only, writers must create their own
+        instance instead.
+        """
+        return _obj_cache.get((code, cls.data_type), lambda: cls(code))
 
     def _read_from_db(self):
         """ Read data from data base.
@@ -113,16 +226,10 @@ class NumExtData(ExtDataPiece):
         """
         # 检查类属性，确认其是否可以正常工作。
         # 从数据库中读取数据
-        db_conn = mysql.connector.connect(**DB_STR)
-        cursor = db_conn.cursor()
-        cursor.execute("SELECT item, date, value "
-                       "FROM num_extend_data "
-                       "WHERE code = %s AND type = %s",
-                       (self.code, self.type))
-        self.data = [list(rec) for rec in cursor]
-        self.log.info("Read %d rows from database" % cursor.rowcount)
-        cursor.close()
-        db_conn.close()
+        self.data = []
+        for chunk in iter_num_ext_data(self.code, self.type):
+            self.data.extend(chunk)
+        self.log.info("Read %d rows from database" % len(self.data))
         # 使用公共函数 _assorted_max 创建数据索引
         # self.new = _assorted_max(self.data, 1)
 
@@ -170,13 +277,15 @@ class NumExtData(ExtDataPiece):
                                "(code, type, item, date, value) "
                                "VALUES (%s, %s, %s, %s, %s)", insert_list)
             db_conn.commit()
+            # 数据库已变更, 缓存中该代码的对象失效
+            _obj_cache.invalidate(self.code, self.type)
         self.log.info("Total %d records write to database." %
                       len(self.insert_idx))
         self.insert_idx = []
         # 其次根据 self.update_idx 更新数据库中的记录
         if len(self.update_idx) > 0:
             self.log.error("Update to database not yet be implemented.")
-            raise ("Need you work more hard.")
+            raise NotImplementedError("Update to database not implemented.")
 
     def _chk_recent(self):
         """ Check if self.recent existend and have valid value. """
@@ -212,10 +321,11 @@ class NumExtData(ExtDataPiece):
 class CaptitalStructureData(NumExtData):
     """ Class used to store Capital Structure data. """
 
+    data_type = "股本结构"
+
     def __init__(self, code):
         super().__init__(code)
         # 类属性定义部分
-        self.type = "股本结构"
         self.table = "num_extend_data"
         # 调用类方法从数据库读取数据
         self._read_from_db()
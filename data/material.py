@@ -0,0 +1,275 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+# 本文件包含预先计算的市值和股本序列, 包含:
+#
+#       MarketCapStore
+#
+#   对每个有股本结构数据的股票代码, 以收盘价日期和股本变动日期的并集为索引,
+#   生成总股本和流通股本 (按 num_extend_data 中的变动日期向前填充)、收盘价、
+#   总市值和流通市值序列, 以列存储的方式保存为 <code>.npz。全市场的最新值另
+#   外保存在 market.npz 中, 供全市场筛选直接读取。每次构建只重建股本结构或收
+#   盘价发生变化的代码。
+#
+#   序列没有展开为逐日数据: 两个索引日期之间没有任何输入变化, 逐日保存只会
+#   重复前一天的值, 而全市场二十年的逐日数据会占用数 GB。查询任意日期的值使
+#   用 value_at, 它对保存的稀疏序列向前填充。
+#
+""" Materialized daily share capital and market cap series. """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import hashlib
+import json
+import logging
+import os
+from datetime import date
+from struct import unpack
+
+import numpy
+
+from config import *
+from data.extended import CaptitalStructureData, iter_num_ext_data
+
+#
+# SECTION: DEFINE EXTERNAL INTERFACE
+#
+__all__ = ['MarketCapStore', 'read_tnf_closes']
+
+#
+# SECTION: GLOBAL VAIRABLE DEFINATION
+#
+# 股本结构中总股本和流通股本对应的标准项目名
+TOTAL_ITEM = "总股本"
+FLOAT_ITEM = "流通A股"
+
+# 通达信文件中的市场标志, 见 etl/test_tdx_file1.py 中的 i[15]
+MARKET_SZ = 0
+MARKET_SH = 1
+
+# 通达信 shm.tnf 和 szm.tnf 的解码模板
+_TNF_HEAD = "<40shii"
+_TNF_HEAD_SIZE = 50
+_TNF_RECORD = "<23s49sIBc8sBBB183sBBBBfBI29s"
+_TNF_RECORD_SIZE = 314
+
+# 每个代码序列文件中保存的列
+_COLUMNS = ('date', 'total', 'float', 'close', 'mcap', 'fmcap')
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+# read_tnf_closes
+#
+#   从通达信代码文件中读取文件日期和每个代码的最近收盘价。上海和深圳使用相
+#   同的代码 (例如上证指数和平安银行都是 000001), 因此以 (市场, 代码) 为键。
+#   收盘价是一个浮点数, 需要对小数点后 2 位取整。
+#
+def read_tnf_closes(path):
+    """ Return (file date, {(market, code): last close}) of a .tnf file. """
+    closes = {}
+    with open(path, "rb") as f:
+        x = unpack(_TNF_HEAD, f.read(_TNF_HEAD_SIZE))[2]
+        file_date = date(x // 10000, x // 100 % 100, x % 100)
+        while True:
+            buffer = f.read(_TNF_RECORD_SIZE)
+            if len(buffer) < _TNF_RECORD_SIZE: break  # EOF
+            rec = unpack(_TNF_RECORD, buffer)
+            code = rec[0].strip(b"\x00").decode("gbk")
+            closes[(rec[15], code)] = round(rec[14], 2)
+    return file_date, closes
+
+
+def _market_of(code):
+    """ Return market of a share code in num_extend_data. """
+    # 上海 A 股以 6 开头, B 股以 9 开头; 其余股票代码属于深圳。
+    return MARKET_SH if code[0] in "69" else MARKET_SZ
+
+
+#
+# _scan_capital
+#
+#   一次扫描全部股本结构数据, 对每个代码计算覆盖所有行 (item, date, value)
+#   的散列作为签名, 并保留总股本和流通股本的变动记录。
+#
+def _scan_capital(chunks):
+    """ Return {code: (signature, {item: (dates, values)})}. """
+    rows = {}
+    for chunk in chunks:
+        for code, item, d, value in chunk:
+            rows.setdefault(code, []).append((item, d, value))
+    capital = {}
+    for code, recs in rows.items():
+        recs.sort(key=lambda r: (r[0], r[1]))
+        sig = hashlib.sha1("\n".join(
+            "%s|%s|%s" % r for r in recs).encode("utf-8")).hexdigest()
+        changes = {}
+        for item in (TOTAL_ITEM, FLOAT_ITEM):
+            sel = [r for r in recs if r[0] == item and r[2] is not None]
+            changes[item] = (
+                numpy.array([r[1] for r in sel], dtype='datetime64[D]'),
+                numpy.array([float(r[2]) for r in sel], dtype='f8'))
+        capital[code] = (sig, changes)
+    return capital
+
+
+def _ffill(dates, values, index):
+    """ Forward fill values changed at dates onto index, NaN before. """
+    pos = numpy.searchsorted(dates, index, side='right') - 1
+    out = numpy.full(len(index), numpy.nan)
+    ok = pos >= 0
+    out[ok] = values[pos[ok]]
+    return out
+
+
+def _save_npz(path, **arrays):
+    """ Write arrays to npz file atomically. """
+    tmp = path + ".tmp.npz"
+    numpy.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+#
+# SECTION: CLASS DEFINATION
+#
+# MarketCapStore
+#
+#   预先计算的市值序列存储.
+#       属性:
+#           path        存储目录
+#           manifest    每个代码的构建状态, 保存在 manifest.json 中
+#       方法:
+#           build       从 .tnf 文件和数据库增量构建序列
+#           series      读取某个代码的序列
+#           value_at    读取某个代码在任意日期的值
+#           market      读取全市场最新值
+#
+class MarketCapStore:
+    """ Columnar store of daily share capital and market cap series. """
+
+    def __init__(self, path=MATERIAL_DIR):
+        super().__init__()
+        # 类属性定义部分
+        self.path = path
+        self.log = logging.getLogger("DEBUG")
+        os.makedirs(path, exist_ok=True)
+        self.manifest = {}
+        if os.path.exists(self._manifest_file()):
+            with open(self._manifest_file(), encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    def _manifest_file(self):
+        return os.path.join(self.path, "manifest.json")
+
+    def _code_file(self, code):
+        return os.path.join(self.path, "%s.npz" % code)
+
+    def build(self, tnf_paths, cap_chunks=None):
+        """ Rebuild series of changed codes, returns list of them.
+
+        cap_chunks is an iterable of [code, item, date, value] row chunks,
+        by default one streaming scan of capital structure rows.
+        """
+        # 各文件的收盘价使用各自文件头中的日期
+        closes = {}
+        for p in tnf_paths:
+            file_date, c = read_tnf_closes(p)
+            for key, close in c.items(): closes[key] = (file_date, close)
+        if cap_chunks is None:
+            cap_chunks = iter_num_ext_data(
+                type_=CaptitalStructureData.data_type,
+                fields=('code', 'item', 'date', 'value'))
+        capital = _scan_capital(cap_chunks)
+
+        # 只处理有股本结构数据的代码, 指数、债券、基金等被忽略。
+        rebuilt = []
+        for code in sorted(capital):
+            sig, changes = capital[code]
+            entry = self.manifest.get(code)
+            price = closes.get((_market_of(code), code))
+            # 从未有过收盘价的代码无法计算市值
+            if price is None and entry is None: continue
+            cap_changed = entry is None or entry.get("cap") != sig
+            price_changed = price is not None and \
+                (entry is None or (entry.get("price_date"), entry.get("price"))
+                 != (price[0].isoformat(), price[1]))
+            if not (cap_changed or price_changed): continue
+            self._build_one(code, sig, changes, price)
+            rebuilt.append(code)
+        if len(rebuilt) > 0:
+            self._save_market()
+            with open(self._manifest_file(), "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, ensure_ascii=False)
+        self.log.info("%d codes rebuilt in materialized store." %
+                      len(rebuilt))
+        return rebuilt
+
+    def _build_one(self, code, sig, changes, price):
+        """ Build and save series of one code. """
+        # 已保存的收盘价观测值, .tnf 文件只有最近收盘价, 因此历史价格只能
+        # 在每次构建时累积。
+        p_dates = numpy.array([], dtype='datetime64[D]')
+        p_values = numpy.array([], dtype='f8')
+        if os.path.exists(self._code_file(code)):
+            with numpy.load(self._code_file(code)) as old:
+                p_dates, p_values = old['price_date'], old['price']
+        # 加入或替换本次收盘价
+        if price is not None:
+            d = numpy.datetime64(price[0], 'D')
+            keep = p_dates != d
+            p_dates = numpy.append(p_dates[keep], d)
+            p_values = numpy.append(p_values[keep], price[1])
+            order = numpy.argsort(p_dates)
+            p_dates, p_values = p_dates[order], p_values[order]
+
+        # 股本变动来自本次扫描, 签名未变时与上次相同, 不需要再查询数据库。
+        index = numpy.union1d(
+            p_dates, numpy.union1d(changes[TOTAL_ITEM][0],
+                                   changes[FLOAT_ITEM][0]))
+        total = _ffill(*changes[TOTAL_ITEM], index)
+        float_ = _ffill(*changes[FLOAT_ITEM], index)
+        close = _ffill(p_dates, p_values, index)
+        cols = {'date': index, 'total': total, 'float': float_,
+                'close': close, 'mcap': close * total,
+                'fmcap': close * float_}
+        _save_npz(self._code_file(code), price_date=p_dates, price=p_values,
+                  **cols)
+
+        # 记录构建状态和最新值
+        entry = {"cap": sig}
+        if len(p_dates) > 0:
+            entry["price_date"] = str(p_dates[-1])
+            entry["price"] = float(p_values[-1])
+        if len(index) > 0:
+            entry["latest"] = [str(index[-1])] + \
+                [float(cols[c][-1]) for c in _COLUMNS[1:]]
+        self.manifest[code] = entry
+
+    def _save_market(self):
+        """ Write latest values of all codes to market.npz. """
+        codes = sorted(c for c, e in self.manifest.items() if "latest" in e)
+        latest = [self.manifest[c]["latest"] for c in codes]
+        arrays = {'code': numpy.array(codes, dtype='U6'),
+                  'date': numpy.array([r[0] for r in latest],
+                                      dtype='datetime64[D]')}
+        for i, col in enumerate(_COLUMNS[1:], 1):
+            arrays[col] = numpy.array([r[i] for r in latest], dtype='f8')
+        _save_npz(os.path.join(self.path, "market.npz"), **arrays)
+
+    def series(self, code):
+        """ Return {column: array} of one code. """
+        with numpy.load(self._code_file(code)) as f:
+            return {c: f[c] for c in _COLUMNS}
+
+    def value_at(self, code, day, column='mcap'):
+        """ Return value of column for code on day, NaN before any data. """
+        s = self.series(code)
+        day = numpy.array([numpy.datetime64(day, 'D')])
+        return float(_ffill(s['date'], s[column], day)[0])
+
+    def market(self):
+        """ Return {column: array} of latest values of all codes. """
+        with numpy.load(os.path.join(self.path, "market.npz")) as f:
+            return {c: f[c] for c in ('code',) + _COLUMNS}
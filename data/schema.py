@@ -0,0 +1,214 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+# 本文件包含数据库表结构的版本化迁移工具, 负责创建和升级以下表:
+#
+#       num_extend_data     数值类扩展数据
+#       nonstd_words        非规范词表
+#       codes               股票代码表
+#
+#   每个迁移有一个版本号, 已执行的版本记录在 schema_version 表中。DDL 尽量
+#   使用 MySQL 和 SQLite 都支持的语法, 以便在没有 MySQL 的环境中用 SQLite
+#   检查索引是否被热点查询使用。
+#
+""" Versioned schema migrations and index checks for stockdata tables. """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import logging
+import sqlite3
+
+#
+# SECTION: DEFINE EXTERNAL INTERFACE
+#
+__all__ = ['MIGRATIONS', 'HOT_QUERIES', 'current_version', 'migrate',
+           'partition_by_code', 'explain_index', 'check_indexes']
+
+#
+# SECTION: GLOBAL VAIRABLE DEFINATION
+#
+_log = logging.getLogger("DEBUG")
+
+# MySQL 建表时附加的表选项, SQLite 中为空
+_MYSQL_TABLE_OPTS = " ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+
+# 迁移列表: (版本号, 说明, [SQL 语句, ...])
+#   语句中的 {opts} 会被替换为对应数据库的表选项。
+MIGRATIONS = [
+    (1, "create base tables", [
+        "CREATE TABLE IF NOT EXISTS num_extend_data ("
+        " code char(6) NOT NULL,"
+        " type char(4) DEFAULT NULL,"
+        " item varchar(10) NOT NULL,"
+        " date date NOT NULL,"
+        " value decimal(20,4) DEFAULT NULL,"
+        " PRIMARY KEY (code, item, date)"
+        "){opts}",
+        "CREATE TABLE IF NOT EXISTS nonstd_words ("
+        " nonstd_word varchar(20) NOT NULL,"
+        " std_word varchar(20) NOT NULL,"
+        " PRIMARY KEY (nonstd_word)"
+        "){opts}",
+        "CREATE TABLE IF NOT EXISTS codes ("
+        " code char(6) NOT NULL,"
+        " market varchar(4) NOT NULL,"
+        " name varchar(16) DEFAULT NULL,"
+        " abbreviation varchar(8) DEFAULT NULL,"
+        " timestamp timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,"
+        " PRIMARY KEY (code, market)"
+        "){opts}",
+    ]),
+    # NumExtData._read_from_db 按 code 和 type 过滤, 读取 item, date, value。
+    # 索引包含全部字段, 查询只需读取索引, 不必回表。
+    (2, "covering index num_extend_data (code, type, item, date, value)", [
+        "CREATE INDEX idx_num_ext_code_type "
+        "ON num_extend_data (code, type, item, date, value)",
+    ]),
+]
+
+# 热点查询: (名称, SQL, 参数, 期望使用的索引)
+#   期望索引为 None 时只要求不是全表扫描。
+HOT_QUERIES = [
+    ("read num_ext by code and type",
+     "SELECT item, date, value FROM num_extend_data "
+     "WHERE code = %s AND type = %s",
+     ("600036", "股本结构"), "idx_num_ext_code_type"),
+    ("read num_ext by code",
+     "SELECT item, date, value FROM num_extend_data WHERE code = %s",
+     ("600036",), None),
+    ("find code",
+     "SELECT code, market, name, abbreviation FROM codes WHERE code = %s",
+     ("600036",), None),
+]
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+# _is_sqlite / _execute
+#
+#   MySQL 使用 %s 作为参数占位符, SQLite 使用 ?, 在此统一转换。
+#
+def _is_sqlite(db_conn):
+    """ Return True if db_conn is a SQLite connection. """
+    return isinstance(db_conn, sqlite3.Connection)
+
+
+def _execute(cursor, db_conn, sql, args=()):
+    """ Execute sql with MySQL style placeholders on any connection. """
+    if _is_sqlite(db_conn): sql = sql.replace("%s", "?")
+    cursor.execute(sql, args)
+
+
+def current_version(db_conn):
+    """ Return applied schema version, 0 for an empty database. """
+    cursor = db_conn.cursor()
+    _execute(cursor, db_conn,
+             "CREATE TABLE IF NOT EXISTS schema_version ("
+             " version int NOT NULL,"
+             " description varchar(80) NOT NULL,"
+             " PRIMARY KEY (version))")
+    _execute(cursor, db_conn, "SELECT MAX(version) FROM schema_version")
+    version = cursor.fetchone()[0]
+    cursor.close()
+    return 0 if version is None else version
+
+
+#
+# migrate
+#
+#   依次执行所有高于当前版本且不高于 target 的迁移, 每个迁移执行后提交并
+#   记录版本号。返回迁移后的版本号。
+#
+def migrate(db_conn, target=None):
+    """ Upgrade database schema to target version, returns new version. """
+    version = current_version(db_conn)
+    opts = "" if _is_sqlite(db_conn) else _MYSQL_TABLE_OPTS
+    cursor = db_conn.cursor()
+    for ver, desc, stmts in MIGRATIONS:
+        if ver <= version: continue
+        if target is not None and ver > target: break
+        _log.info("Migrate schema to version %d: %s" % (ver, desc))
+        for stmt in stmts:
+            _execute(cursor, db_conn, stmt.format(opts=opts))
+        _execute(cursor, db_conn,
+                 "INSERT INTO schema_version (version, description) "
+                 "VALUES (%s, %s)", (ver, desc))
+        db_conn.commit()
+        version = ver
+    cursor.close()
+    return version
+
+
+#
+# partition_by_code
+#
+#   可选的按代码范围分区, 仅 MySQL 支持。bounds 为各分区的代码上界, 最后
+#   一个分区总是 MAXVALUE。主键包含 code, 因此满足分区键的要求。分区会重建
+#   整个表, 因此已经分区时直接返回 False。
+#
+def partition_by_code(db_conn, bounds=("300000", "600000", "900000")):
+    """ Partition num_extend_data by code range once, MySQL only.
+
+    Returns True if the table was partitioned by this call.
+    """
+    if _is_sqlite(db_conn):
+        raise ValueError("SQLite does not support partitioning!")
+    cursor = db_conn.cursor()
+    _execute(cursor, db_conn,
+             "SELECT COUNT(*) FROM information_schema.PARTITIONS "
+             "WHERE TABLE_SCHEMA = DATABASE() "
+             "AND TABLE_NAME = 'num_extend_data' "
+             "AND PARTITION_NAME IS NOT NULL")
+    if cursor.fetchone()[0] > 0:
+        cursor.close()
+        _log.info("Table num_extend_data is already partitioned.")
+        return False
+    parts = ["PARTITION p%d VALUES LESS THAN ('%s')" % (i, b)
+             for i, b in enumerate(bounds)]
+    parts.append("PARTITION p%d VALUES LESS THAN (MAXVALUE)" % len(bounds))
+    _execute(cursor, db_conn,
+             "ALTER TABLE num_extend_data "
+             "PARTITION BY RANGE COLUMNS(code) (%s)" % ", ".join(parts))
+    cursor.close()
+    return True
+
+
+#
+# explain_index
+#
+#   用 EXPLAIN 查看查询使用的索引, 全表扫描时返回 None。SQLite 的主键索引
+#   名为 sqlite_autoindex_<表名>_N, MySQL 的为 PRIMARY。
+#
+def explain_index(db_conn, sql, args=()):
+    """ Return name of index used by query, None for full table scan. """
+    cursor = db_conn.cursor()
+    if _is_sqlite(db_conn):
+        _execute(cursor, db_conn, "EXPLAIN QUERY PLAN " + sql, args)
+        # 每行最后一列为说明, 例如 "SEARCH t USING INDEX idx (code=?)"
+        index = None
+        for row in cursor.fetchall():
+            detail = row[-1]
+            if "USING PRIMARY KEY" in detail:
+                index = "PRIMARY"
+            elif "USING" in detail and "INDEX" in detail:
+                index = detail.split("INDEX ")[1].split(" ")[0]
+    else:
+        _execute(cursor, db_conn, "EXPLAIN " + sql, args)
+        cols = [d[0] for d in cursor.description]
+        index = cursor.fetchall()[0][cols.index("key")]
+    cursor.close()
+    return index
+
+
+def check_indexes(db_conn):
+    """ Check hot queries use expected indexes, returns list of failures. """
+    failed = []
+    for name, sql, args, expected in HOT_QUERIES:
+        index = explain_index(db_conn, sql, args)
+        if index is None or (expected is not None and index != expected):
+            failed.append((name, expected, index))
+            _log.error("Query '%s' uses index %s, expected %s." %
+                       (name, index, expected or "any"))
+    return failed
@@ -0,0 +1,37 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+#   本文件包含所有数据抓取器的基类:
+#       Extractor
+#
+""" Root class of all data extractors. """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import logging
+
+#
+# SECTION: DEFINE EXTERNAL INTERFACE
+#
+__all__ = ['Extractor']
+
+
+#
+# SECTION: CLASS DEFINATION
+#
+#   所有数据抓取器的基类.
+#       属性:
+#           state(str)  用于记录状态, 例如 "抓取成功", "转换结束"。
+#       方法:
+#
+class Extractor:
+    """ Root class of all data extractors """
+
+    def __init__(self):
+        super().__init__()
+        # 类属性定义部分
+        self._state = "已初始化"
+        # 添加类调试使用 Logger
+        self.log = logging.getLogger("DEBUG")
+        self.log.info("'Extractor' instance is initialized.")
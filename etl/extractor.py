@@ -1,13 +1,16 @@
 #!/usr/local/python/bin/python
 # -*- coding: utf-8 -*-
 #
-#   本文件包含 Extractor 系列中通用超类的定义, 包含:
-#       Extractor
+#   本文件包含网页数据抓取器的定义, 包含:
+#       Extractor (etl.base)
 #           WebExtractor
-#               SinaSSE
-#           FileExtractor
+#               SpecExtractor
+#                   SinaSSE
+#           FileExtractor (etl.tdx)
 #               TdxCodeFile
 #
+#   文件抓取器不需要 lxml, 放在 etl.tdx 中, 以免导入时载入 lxml。
+#
 """ Module contains the classes of used to extrac data from source.  """
 
 #
@@ -17,108 +20,113 @@ import logging
 from datetime import date
 from urllib import request
 
-from lxml import html
+from lxml import etree, html
 from lxml.html.clean import Cleaner
 
 import etl.stdzn
-
-# from struct import unpack
-
+from etl.base import Extractor
+from etl.tdx import FileExtractor, TdxCodeFile
 
 #
 # SECTION: DEFINE EXTERNAL INTERFACE
 #
-__all__ = ['SinaSSE', 'TdxCodeFile']
+__all__ = ['ExtractSpec', 'SpecExtractor', 'SinaSSE', 'TdxCodeFile',
+           'SPECS', 'SINA_SSE', 'register_spec']
 
 #
 # SECTION: DEFINE GLOBAL VARIABLES
 #
-_word_stdnz = etl.stdzn.WordSTDZN()
+# 非规范词表需要读取数据库, 因此在第一次使用时才创建, 以免导入本模块就连接
+# 数据库。
+_word_stdnz = None
+
+# 预编译的二维表格行和单元格 XPath
+_XP_ROWS = etree.XPath(".//tr")
+_XP_CELLS = etree.XPath(".//td")
 
 
 #
-# SECTION: CLASS DEFINATION
-#
-#   所有数据抓取器的基类.
-#       属性:
-#           state(str)  用于记录状态, 例如 "抓取成功", "转换结束"。
-#       方法:
+# SECTION: GLOBAL FUNCTION DEFINATION
 #
-class Extractor:
-    """ Root class of all data extractors """
-
-    def __init__(self):
-        super().__init__()
-        # 类属性定义部分
-        self._state = "已初始化"
-        # 添加类调试使用 Logger
-        self.log = logging.getLogger("DEBUG")
-        self.log.info("'Extractor' instance is initialized.")
+def _get_stdzn():
+    """ Return the shared WordSTDZN instance, create it when first used. """
+    global _word_stdnz
+    if _word_stdnz is None: _word_stdnz = etl.stdzn.WordSTDZN()
+    return _word_stdnz
 
 
+#
+# SECTION: CLASS DEFINATION
 #
 #   WebExtractor 网络数据抓取器的超类, Extractor 的子类
 #
 #       属性:
-#           url(str)    Web 数据的 URL
+#           url(str)    Web 数据的 URL, 不含 "://" 时视为本地文件路径
 #           parser      lxml.etree.HTMLParser hmtl 解析器
+#           cleaner     lxml.html.clean.Cleaner html 清洗器
 #           tree        lxml.etree.Element 对象, 存放解析后 html 树的根节点。
 #       方法:
 #           fetch()     重载方法, 实现抓取数据。
-#           _purge()    用于抓取后数据的简单清洗, 被 fetch 直接调用。
-#           _trans2DHtmlTab
+#           _add_from_2d_table
 #                       tree 中的数据是若干个 2 标准二维数据表时转换数据用。
 #
 class WebExtractor(Extractor):
     """ Superclass of all web data extractors """
 
-    def __init__(self, url):
+    def __init__(self, url, parser, cleaner):
         super().__init__()
         # 类属性定义部分
         self.url = url
+        self.parser = parser
+        self.cleaner = cleaner
         self.data = []
         self.tree = None
 
-    def _add_from_2d_table(self, table):
+    def _add_from_2d_table(self, table, rows_xp=_XP_ROWS, cells_xp=_XP_CELLS,
+                           skip_rows=0, transpose=False):
         """ Add data in a 2D table to 'tree', returns none. """
 
         # 本方法用来将标准的二维数据表装换成列表 [行标题, 列标题, 单元数据]。
         # 二维数据表格式必须标准, 即第一行为列标题, 第一列为行标题，每行数据单
         # 元数量与列标题数相等。
         #   160813: 增加忽略单元格数目少于列表的行的能力。
+        #   表格前 skip_rows 行不是数据时跳过; transpose 为真时输出
+        #   [列标题, 行标题, 单元数据]。
         #
-        rows = table.xpath(".//tr")
+        rows = rows_xp(table)[skip_rows:]
+        if len(rows) == 0: return
         # 先抽取列标题, 否则无法构成后面的数据
         get_text = lambda tag: "" if tag.text is None else tag.text.strip()
-        cheads = [get_text(td) for td in rows[0].xpath(".//td")]
+        cheads = [get_text(td) for td in cells_xp(rows[0])]
         hwidth = len(cheads)
         # 处理包含的数据
         for row in rows[1:]:
-            cells = [get_text(cell) for cell in row.xpath(".//td")]
+            cells = [get_text(cell) for cell in cells_xp(row)]
             rwidth = len(cells)
             if rwidth != hwidth: continue
             for i in range(1, rwidth):
-                self.data.append([cells[0], cheads[i], cells[i]])
+                if transpose:
+                    self.data.append([cheads[i], cells[0], cells[i]])
+                else:
+                    self.data.append([cells[0], cheads[i], cells[i]])
 
     def fetch(self):
         """ Fetches html from web, returns None. """
 
         # 抓取 html 网页
         self.log.info("Start to fetch page : %s" % self.url)
-        parser = html.HTMLParser(encoding="gbk",
-                                 remove_blank_text=True,
-                                 remove_comments=True)
-        # try:
-        # f = request.urlopen(self.url)
-        f = open("D:\\Coding\\600036.htm","r")
-        self.tree = html.parse(f, parser).getroot()
+        if "://" in self.url:
+            f = request.urlopen(self.url)
+        else:
+            f = open(self.url, "rb")
+        try:
+            self.tree = html.parse(f, self.parser).getroot()
+        finally:
+            f.close()
         self.log.info("HTML page fetched.")
 
         # 数据的初步清洗, 以节约部分内存。
-        html_cleaner = Cleaner(style=True,
-                               page_structure=False,
-                               kill_tags=('a',))
-        self.tree = html_cleaner.clean_html(self.tree)
+        self.tree = self.cleaner.clean_html(self.tree)
         # 完成裸数据清洗后, 将实例状态改为 "抓取成功"
         self._state = "抓取成功"
         self.log.info("HTML tree purged.")
@@ -127,42 +135,78 @@ class WebExtractor(Extractor):
 
 
 #
-#   FileExtractor 文件数据抓取器的超类, Extractor 的子类
-#
-#       属性:
-#           path(str)   文件数据的 PATH
-#       方法:
-#           fetch()     重载方法, 实现抓取数据。
-#
-# class FileExtractor(Extractor):
-#     """ Superclass of all web data extractors """
+# SECTION: CLASS DEFINATION
 #
-#     def __init__(self, path):
-#         super().__init__()
-#         # 类属性定义部分
-#         self.path = path
+#   ExtractSpec 网页数据抽取规格
 #
+#   由于股票基本面数据大多以数据表格的方式提供, 因此抽取相关 html 的工作大体
+#   为, 首先定位包含数据的容器标签; 其次删除容器中不包含数据的表格; 最后将表
+#   格格式标准化。不同网页之间只有这些规则不同, 因此用规格来描述一个网页, 而
+#   不必为每个网页编写子类。XPath 在创建规格时编译, 解析器和清洗器也只创建一
+#   次, 在抓取成千上万个网页时重复使用。
 #
+#   lxml 的解析器不是线程安全的, 同一规格的所有抓取器共享其解析器, 因此抓取
+#   器只能在单个线程中使用。
 #
-# SECTION: CLASS DEFINATION
+#       属性:
+#           name(str)       规格名称, 例如 "sina-sse"
+#           url(str)        URL 模板, 以 {code} 表示股票代码
+#           data_type(str)  目标数据类型, 与 NumExtData.data_type 对应
+#           tables          定位数据表格的 XPath
+#           drop            表格中需要删除的元素的 XPath 列表
+#           rows, cells     表格中行和单元格的 XPath
+#           skip_rows(int)  列标题前需要跳过的行数
+#           transpose(bool) 行标题为日期时为真
+#           parser, cleaner 重复使用的解析器和清洗器
+#       方法:
+#           url_for()       生成某个股票代码的 URL
 #
-#   新浪股本数据抓取器, WebExtractor 的子类
+class ExtractSpec:
+    """ Declarative and precompiled extraction rules of a web page. """
+
+    def __init__(self, name, url, data_type, tables="//table[@id]",
+                 drop=(".//thead",), rows=".//tr", cells=".//td",
+                 skip_rows=0, transpose=False, encoding="gbk",
+                 kill_tags=('a',)):
+        super().__init__()
+        # 类属性定义部分
+        self.name = name
+        self.url = url
+        self.data_type = data_type
+        self.tables = etree.XPath(tables)
+        self.drop = [etree.XPath(xp) for xp in drop]
+        self.rows = etree.XPath(rows)
+        self.cells = etree.XPath(cells)
+        self.skip_rows = skip_rows
+        self.transpose = transpose
+        self.parser = html.HTMLParser(encoding=encoding,
+                                      remove_blank_text=True,
+                                      remove_comments=True)
+        self.cleaner = Cleaner(style=True, page_structure=False,
+                               kill_tags=kill_tags)
+
+    def url_for(self, code):
+        """ Return URL of the page for a share code. """
+        return self.url.format(code=code)
+
+
 #
-#   通过重载方法 transfrom(), 实现对不同数据种类和不同数据来源的 html 数据抽取
-#   的转换。由于股票基本面数据大多以数据表格的方式提供, 因此抽取相关 html 的工
-#   作大体为, 首先定位包含数据的容器标签; 其次删除容器中不包含数据的表格; 最后
-#   将表格格式标准化。
+#   SpecExtractor 按 ExtractSpec 抽取数据的网页抓取器, WebExtractor 的子类
 #
 #       属性:
+#           spec        ExtractSpec 对象
 #           code(str)   数据所属的股票代码
 #       方法:
-#           transform() 重载方法, 实现抓取数据。
+#           fetch()     重载方法, 抓取网页并按规格转换为记录的列表。
+#           upload()    将数据写入对应的数据对象。
 #
-class SinaSSE(WebExtractor):
-    """Class for 'capital structure of a Share from Sina'"""
+class SpecExtractor(WebExtractor):
+    """ Web extractor driven by an ExtractSpec. """
 
-    def __init__(self, code, url):
-        super().__init__(url)
+    def __init__(self, spec, code, url=None):
+        super().__init__(spec.url_for(code) if url is None else url,
+                         spec.parser, spec.cleaner)
+        self.spec = spec
         self.code = code
 
     def fetch(self):
@@ -172,104 +216,74 @@ class SinaSSE(WebExtractor):
         super().fetch()
 
         # 数组转换，将 fetch 得到的 html 树转换为记录的列表。
-        #   新浪 "股本结构" 网页的数据包含在多个带 id 的表格中。
-        tables = self.tree.xpath("//table[@id]")
-        for table in tables:
-            # 每个数据都有一个无用的表头，直接删除。
-            table.xpath(".//thead")[0].drop_tree()
-            self._add_from_2d_table(table)
+        spec = self.spec
+        for table in spec.tables(self.tree):
+            # 删除表格中无用的部分, 例如表头。
+            for xp in spec.drop:
+                for elem in xp(table): elem.drop_tree()
+            self._add_from_2d_table(table, spec.rows, spec.cells,
+                                    spec.skip_rows, spec.transpose)
         self._state = ("转换成功" if len(self.data) > 0 else "转换失败")
         # DEBUG
         self.log.info("Total %d data records found in page." % len(self.data))
-        # for i in self.data: print(i)
         # 丢弃 html tree 以节约内存
         self.tree = None
 
     def upload(self, data_obj):
-        """ Write capital structure to database. """
+        """ Write data to data object, keep failed records in 'data'. """
         #
         # 通过将数据写入对应数据对象，由数据对象完成将数据写入数据库的操作。
+        # 记录形式为 [项目, 日期, 数值], 日期格式为 "YYYY-MM-DD"。
         #
         # 逐条读取数据
         failed_data = []
+        stdzn = _get_stdzn()
         while self.data != []:
             rec = self.data.pop()
             # 将数据转换为数据对象的标准形式
-            item_d = _word_stdnz.fix_word(rec[0])  # 标准化关键字字段
+            item_d = stdzn.fix_word(rec[0])  # 标准化关键字字段
             date_d = date(*[int(n) for n in rec[1].split("-")])
-            valu_d = _word_stdnz.rm_quant(rec[2])
+            valu_d = stdzn.rm_quant(rec[2])
             # 尝试将数据写入数据对象, 失败则存入列表
             new_rec =  [item_d, date_d, valu_d]
             if "" in new_rec: continue
             if not data_obj.add_one(new_rec): failed_data.append(new_rec)
         self.data = failed_data
 
+
 #
-#   TdxCodeFile
-#
-#       属性:
-#           path(str)   文件数据的 PATH
-#       方法:
-#           fetch()     重载方法, 实现抓取数据。
-#
-# class TdxCodeFile(FileExtractor):
-#     """ Superclass of all web data extractors """
-#
-#     def __init__(self, market, path, **kw):
-#         super().__init__(path)
-#         # 类属性定义部分
-#         self.market = market
-#         self.data = []
-#         self.log.info("Code file extractor initialized for %s." % market)
-#
-#     def fetch(self):
-#         """"""
-#         f = open(self.path, "rb")
-#         # 处理文件头
-#         head_size = 50  # 此处定义了文件头部的大小
-#         conv_date = lambda x: date(x // 10000, x // 100 % 100, x % 100)
-#         buffer = f.read(head_size)
-#         date = conv_date(unpack("<40shii", buffer)[2])
-#         # DEBUG
-#         self.log.info("Get date from head of data file = %s" % date)
-#
-#         # 处理正文部分的数据记录
-#         recd_size = 314  # 此处定义了记录的直接长度
-#         conv_cstr = lambda s: s.strip(b"\x00")
-#         while True:
-#             buffer = f.read(recd_size)
-#             if len(buffer) < recd_size:  # 如果读到的记录长度不对, 意味 EOF
-#                 break
-#             else:
-#                 v1, v2, v3, v4 = [conv_cstr(s) for s in
-#                                   unpack("<23s49s213s29s", buffer)]
-#                 # print(v1.decode("gbk"),v2.decode("gbk"),v4.decode("gbk"))
-#                 self.data.append(
-#                     [v1.decode("gbk"), self.market, v2.decode("gbk"),
-#                      v4.decode("gbk")])
-#         f.close()
-#         # DEBUG
-#         self.log.info(
-#             "Data fetched from file, total %d records." % len(self.data))
-#         # for i in range(0,len(self.keys)):
-#         #     print(self.keys[i], self.vals[i])
-#
-#     def upload(self):
-#         """ Update data to database. """
-#         # 将数据表读入内存
-#         self.log.info("Start to update database.")
-#         records = self.mysql.select(
-#             "SELECT code, market, name, abbreviation, timestamp FROM codes;")
-#
-#         # DEBUG
-#         for r in records:
-#             print(r)  # SECTION: SELFTESTING
+#   新浪股本数据抓取器, SpecExtractor 的子类
 #
+#   新浪 "股本结构" 网页的数据包含在多个带 id 的表格中, 每个表格都有一个无用
+#   的表头。
 #
-# class Normalizer():
-#     """ A class which method used to nomalizer """
+#       属性:
+#           code(str)   数据所属的股票代码
 #
+SINA_SSE = ExtractSpec(
+    "sina-sse",
+    "http://vip.stock.finance.sina.com.cn/corp/go.php/"
+    "vCI_StockStructure/stockid/{code}.phtml",
+    "股本结构")
+
+
+class SinaSSE(SpecExtractor):
+    """Class for 'capital structure of a Share from Sina'"""
+
+    def __init__(self, code, url=None):
+        super().__init__(SINA_SSE, code, url)
+
+
 #
-#   Selftesing syntax: python <filename>
+# 已注册的抽取规格, 键为规格名称
 #
-# if __name__ == "__main__":
+SPECS = {}
+
+
+def register_spec(spec):
+    """ Register an ExtractSpec by its name, returns the spec. """
+    SPECS[spec.name] = spec
+    return spec
+
+
+register_spec(SINA_SSE)
@@ -0,0 +1,108 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+#   本文件包含文件数据抓取器的定义, 包含:
+#       Extractor (etl.base)
+#           FileExtractor
+#               TdxCodeFile
+#
+#   本文件不依赖 lxml, "stockdata import tdx-codes" 只需载入本文件。
+#
+""" Extractors of data in local files. """
+
+#
+# SECTION: MODULE IMPORTS
+#
+from datetime import date
+from struct import unpack
+
+from etl.base import Extractor
+
+#
+# SECTION: DEFINE EXTERNAL INTERFACE
+#
+__all__ = ['FileExtractor', 'TdxCodeFile']
+
+
+#
+# SECTION: CLASS DEFINATION
+#
+#   FileExtractor 文件数据抓取器的超类, Extractor 的子类
+#
+#       属性:
+#           path(str)   文件数据的 PATH
+#       方法:
+#           fetch()     重载方法, 实现抓取数据。
+#
+class FileExtractor(Extractor):
+    """ Superclass of all file data extractors """
+
+    def __init__(self, path):
+        super().__init__()
+        # 类属性定义部分
+        self.path = path
+        self.data = []
+
+
+#
+#   TdxCodeFile 通达信代码文件抓取器, FileExtractor 的子类
+#
+#       属性:
+#           market(str) 代码所属市场, 例如 "上海"
+#       方法:
+#           fetch()     重载方法, 实现抓取数据。
+#           upload()    将代码写入数据库表 codes
+#
+class TdxCodeFile(FileExtractor):
+    """ Class for share codes in TDX 'shm.tnf' and 'szm.tnf' files """
+
+    def __init__(self, market, path):
+        super().__init__(path)
+        # 类属性定义部分
+        self.market = market
+        self.log.info("Code file extractor initialized for %s." % market)
+
+    def fetch(self):
+        """ Read code records from file, returns None. """
+        f = open(self.path, "rb")
+        # 处理文件头
+        head_size = 50  # 此处定义了文件头部的大小
+        conv_date = lambda x: date(x // 10000, x // 100 % 100, x % 100)
+        buffer = f.read(head_size)
+        file_date = conv_date(unpack("<40shii", buffer)[2])
+        # DEBUG
+        self.log.info("Get date from head of data file = %s" % file_date)
+
+        # 处理正文部分的数据记录
+        recd_size = 314  # 此处定义了记录的直接长度
+        conv_cstr = lambda s: s.strip(b"\x00")
+        while True:
+            buffer = f.read(recd_size)
+            if len(buffer) < recd_size:  # 如果读到的记录长度不对, 意味 EOF
+                break
+            else:
+                v1, v2, v3, v4 = [conv_cstr(s) for s in
+                                  unpack("<23s49s213s29s", buffer)]
+                self.data.append(
+                    [v1.decode("gbk"), self.market, v2.decode("gbk"),
+                     v4.decode("gbk")])
+        f.close()
+        self._state = "抓取成功"
+        # DEBUG
+        self.log.info(
+            "Data fetched from file, total %d records." % len(self.data))
+
+    def upload(self, db_conn):
+        """ Write codes to database table 'codes'. """
+        self.log.info("Start to update database.")
+        cursor = db_conn.cursor()
+        cursor.executemany("INSERT INTO codes "
+                           "(code, market, name, abbreviation) "
+                           "VALUES (%s, %s, %s, %s) "
+                           "ON DUPLICATE KEY UPDATE "
+                           "name = VALUES(name), "
+                           "abbreviation = VALUES(abbreviation)", self.data)
+        db_conn.commit()
+        cursor.close()
+        self.log.info("Total %d codes write to database." % len(self.data))
+        self.data = []
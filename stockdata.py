@@ -0,0 +1,216 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+#   stockdata 命令行入口, 包含子命令:
+#       crawl SPEC          按抽取规格抓取网页数据并写入数据库
+#       import tdx-codes    从通达信代码文件导入股票代码
+#       export              将 num_extend_data 导出为 CSV
+#       migrate             创建或升级数据库表结构
+#       materialize         增量构建预先计算的市值序列
+#
+#   lxml, mysql.connector 和 NumPy 导入很慢, 因此只在子命令的处理函数中导入,
+#   这样 "--help" 和 cron 调用的短任务可以快速启动。导入时间由
+#   test_cli_startup.py 检查。
+#
+""" Command line entry point of stockdata. """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import argparse
+import logging
+import sys
+
+#
+# SECTION: DEFINE EXTERNAL INTERFACE
+#
+__all__ = ['main']
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+# _set_logging
+#
+#   创建日志机制, 仅输出日志到标准错误输出。
+#
+def _set_logging(verbose):
+    """ Set up 'DEBUG' logger to stderr. """
+    fmt = logging.Formatter(
+        fmt='%(asctime)s %(levelname)8s %(name)s : %(message)s',
+        datefmt='%m-%d %H:%M:%S |')
+    ch = logging.StreamHandler()
+    ch.setFormatter(fmt)
+    log = logging.getLogger("DEBUG")
+    log.setLevel(logging.DEBUG if verbose else logging.WARNING)
+    log.addHandler(ch)
+
+
+def _crawl(args):
+    """ Fetch pages of a registered spec and write to database. """
+    from data.extended import ext_data_class
+    from etl.extractor import SPECS, SpecExtractor
+
+    if args.spec not in SPECS:
+        print("Unknown spec '%s', available: %s." %
+              (args.spec, ", ".join(sorted(SPECS))), file=sys.stderr)
+        return 2
+    spec = SPECS[args.spec]
+    data_cls = ext_data_class(spec.data_type)
+    for code in args.codes:
+        # 写入数据库的对象不能使用共享的缓存对象
+        data_obj = data_cls(code)
+        extractor = SpecExtractor(spec, code)
+        extractor.fetch()
+        extractor.upload(data_obj)
+        data_obj.update_database()
+    return 0
+
+
+def _import_tdx_codes(args):
+    """ Import share codes from TDX code file. """
+    import mysql.connector
+
+    from config import DB_STR
+    from etl.tdx import TdxCodeFile
+
+    extractor = TdxCodeFile(args.market, args.path)
+    extractor.fetch()
+    db_conn = mysql.connector.connect(**DB_STR)
+    try:
+        extractor.upload(db_conn)
+    finally:
+        db_conn.close()
+    return 0
+
+
+def _export(args):
+    """ Export num_extend_data as CSV. """
+    import csv
+
+    from data.extended import iter_num_ext_data
+
+    out = sys.stdout if args.output == "-" else \
+        open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        writer = csv.writer(out)
+        writer.writerow(args.fields)
+        for chunk in iter_num_ext_data(args.code, args.type,
+                                       args.chunk_size, args.fields):
+            writer.writerows(chunk)
+    finally:
+        if out is not sys.stdout: out.close()
+    return 0
+
+
+def _migrate(args):
+    """ Upgrade database schema and check indexes of hot queries. """
+    from data import schema
+
+    if args.sqlite is not None:
+        import sqlite3
+        db_conn = sqlite3.connect(args.sqlite)
+    else:
+        import mysql.connector
+        from config import DB_STR
+        db_conn = mysql.connector.connect(**DB_STR)
+    try:
+        version = schema.migrate(db_conn, args.target)
+        print("Schema version %d." % version)
+        if args.partition and not schema.partition_by_code(db_conn):
+            print("Table num_extend_data is already partitioned.")
+        if args.check:
+            failed = schema.check_indexes(db_conn)
+            for name, expected, index in failed:
+                print("Query '%s' uses index %s, expected %s." %
+                      (name, index, expected or "any"))
+            if failed: return 1
+    finally:
+        db_conn.close()
+    return 0
+
+
+def _materialize(args):
+    """ Rebuild market cap series of changed codes. """
+    from config import MATERIAL_DIR
+    from data.material import MarketCapStore
+
+    store = MarketCapStore(args.dir or MATERIAL_DIR)
+    rebuilt = store.build(args.paths)
+    print("%d codes rebuilt." % len(rebuilt))
+    return 0
+
+
+def _build_parser():
+    """ Return the argument parser of all sub commands. """
+    parser = argparse.ArgumentParser(
+        prog="stockdata",
+        description="Data extractor tool for Chinese stock market.")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="print debug log to stderr")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+
+    # crawl
+    crawl = commands.add_parser("crawl", help="fetch data from web")
+    crawl.add_argument("spec", metavar="SPEC",
+                       help="registered extraction spec, e.g. sina-sse")
+    crawl.add_argument("codes", nargs="+", metavar="CODE")
+    crawl.set_defaults(func=_crawl)
+
+    # import
+    imp = commands.add_parser("import", help="import data from file")
+    sources = imp.add_subparsers(dest="source", metavar="SOURCE")
+    sources.required = True
+    tdx = sources.add_parser("tdx-codes",
+                             help="share codes from TDX .tnf file")
+    tdx.add_argument("market", help="market name, e.g. 上海")
+    tdx.add_argument("path", help="path of shm.tnf or szm.tnf")
+    tdx.set_defaults(func=_import_tdx_codes)
+
+    # export
+    exp = commands.add_parser("export", help="export num_extend_data as CSV")
+    exp.add_argument("--code", help="only export this code")
+    exp.add_argument("--type", help="only export this data type")
+    exp.add_argument("--fields", nargs="+",
+                     default=["code", "type", "item", "date", "value"],
+                     choices=["code", "type", "item", "date", "value"])
+    exp.add_argument("--chunk-size", type=int, default=10000)
+    exp.add_argument("-o", "--output", default="-",
+                     help="output file, '-' for stdout")
+    exp.set_defaults(func=_export)
+
+    # migrate
+    mig = commands.add_parser("migrate", help="create or upgrade tables")
+    mig.add_argument("--target", type=int,
+                     help="schema version to upgrade to, default latest")
+    mig.add_argument("--partition", action="store_true",
+                     help="partition num_extend_data by code range (MySQL)")
+    mig.add_argument("--check", action="store_true",
+                     help="check hot queries use indexes via EXPLAIN")
+    mig.add_argument("--sqlite", metavar="PATH",
+                     help="use a SQLite database instead of MySQL")
+    mig.set_defaults(func=_migrate)
+
+    # materialize
+    mat = commands.add_parser("materialize",
+                              help="build market cap series")
+    mat.add_argument("paths", nargs="+", metavar="TNF",
+                     help="TDX shm.tnf / szm.tnf with last close prices")
+    mat.add_argument("--dir", help="output directory, default MATERIAL_DIR")
+    mat.set_defaults(func=_materialize)
+    return parser
+
+
+def main(argv=None):
+    """ Parse command line and run sub command, returns exit code. """
+    args = _build_parser().parse_args(argv)
+    _set_logging(args.verbose)
+    return args.func(args)
+
+
+#
+# SECTION: SELFTESTING
+#
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+""" Used to test ObjectCache """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import threading
+import time
+
+from data.cache import ObjectCache
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+# 测试中对象大小固定为 10 字节
+def sizeof(obj):
+    return 10
+
+
+def test_lru_eviction():
+    """ Least recently used objects are evicted over memory budget. """
+    cache = ObjectCache(max_bytes=30, ttl=None, sizeof=sizeof)
+    for code in ("1", "2", "3"):
+        cache.get((code, "t"), lambda: code)
+    cache.get(("1", "t"), lambda: "reloaded")  # "1" 变为最近使用
+    cache.get(("4", "t"), lambda: "4")
+    assert ("2", "t") not in cache
+    assert ("1", "t") in cache and ("4", "t") in cache
+    assert len(cache) == 3 and cache.used == 30
+    assert cache.get(("1", "t"), lambda: "reloaded") == "1"
+
+
+def test_ttl_expiry():
+    """ Expired objects are loaded again. """
+    cache = ObjectCache(max_bytes=100, ttl=0.05, sizeof=sizeof)
+    assert cache.get(("1", "t"), lambda: "old") == "old"
+    assert cache.get(("1", "t"), lambda: "new") == "old"
+    time.sleep(0.1)
+    assert cache.get(("1", "t"), lambda: "new") == "new"
+    assert cache.used == 10
+
+
+def test_single_flight():
+    """ Concurrent gets of the same key call loader only once. """
+    cache = ObjectCache(max_bytes=100, ttl=None, sizeof=sizeof)
+    calls, results = [], []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return "obj"
+
+    threads = [threading.Thread(
+        target=lambda: results.append(cache.get(("1", "t"), loader)))
+        for i in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(calls) == 1
+    assert results == ["obj"] * 8
+
+
+def test_single_flight_oversized():
+    """ Waiters share the result even when it is too large to cache. """
+    cache = ObjectCache(max_bytes=5, ttl=None, sizeof=sizeof)
+    calls, results = [], []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return "big"
+
+    threads = [threading.Thread(
+        target=lambda: results.append(cache.get(("1", "t"), loader)))
+        for i in range(5)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(calls) == 1
+    assert results == ["big"] * 5
+    assert ("1", "t") not in cache
+
+
+def test_loader_exception():
+    """ A waiting thread takes over loading when the loader fails. """
+    cache = ObjectCache(max_bytes=100, ttl=None, sizeof=sizeof)
+    started = threading.Event()
+    errors, results = [], []
+
+    def bad_loader():
+        started.set()
+        time.sleep(0.1)
+        raise IOError("db down")
+
+    def first():
+        try:
+            cache.get(("1", "t"), bad_loader)
+        except IOError:
+            errors.append(1)
+
+    t1 = threading.Thread(target=first)
+    t1.start()
+    started.wait()
+    t2 = threading.Thread(
+        target=lambda: results.append(cache.get(("1", "t"), lambda: "ok")))
+    t2.start()
+    t1.join()
+    t2.join()
+    assert errors == [1] and results == ["ok"]
+    assert ("1", "t") in cache
+
+
+def test_invalidate():
+    """ Invalidate drops cached objects and discards in-flight loads. """
+    cache = ObjectCache(max_bytes=100, ttl=None, sizeof=sizeof)
+    cache.get(("1", "a"), lambda: "1a")
+    cache.get(("1", "b"), lambda: "1b")
+    cache.get(("2", "a"), lambda: "2a")
+    cache.invalidate("1", "a")
+    assert ("1", "a") not in cache and ("1", "b") in cache
+    cache.invalidate("1")
+    assert ("1", "b") not in cache and ("2", "a") in cache
+    assert cache.used == 10
+
+    # 读取开始后才提交的变更, 读到的旧对象不能被缓存
+    started = threading.Event()
+
+    def slow_loader():
+        started.set()
+        time.sleep(0.1)
+        return "stale"
+
+    t = threading.Thread(target=lambda: cache.get(("3", "a"), slow_loader))
+    t.start()
+    started.wait()
+    cache.invalidate("3", "a")
+    t.join()
+    assert ("3", "a") not in cache
+    assert cache.get(("3", "a"), lambda: "fresh") == "fresh"
+
+
+#
+# SECTION: SELFTESTING
+#
+#   Selftesing syntax: python <filename>
+#
+if __name__ == "__main__":
+    for test in (test_lru_eviction, test_ttl_expiry, test_single_flight,
+                 test_single_flight_oversized, test_loader_exception,
+                 test_invalidate):
+        test()
+        print("%-24s OK" % test.__name__)
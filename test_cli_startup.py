@@ -0,0 +1,90 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+""" Used to test start-up time of stockdata command line """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import os
+import subprocess
+import sys
+
+import pytest
+
+#
+# SECTION: GLOBAL VAIRABLE DEFINATION
+#
+# 这些模块导入很慢, 不允许在 "--help" 时被导入
+HEAVY_MODULES = ("lxml", "mysql", "numpy")
+# 全部导入的累计时间上限 (微秒)
+MAX_IMPORT_US = 100000
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+def import_times(argv):
+    """ Run stockdata with '-X importtime', return [(module, depth, us)]. """
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime",
+         os.path.join(here, "stockdata.py")] + argv,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True, cwd=here)
+    times = []
+    # 输出格式: "import time: self [us] | cumulative | imported package",
+    # 模块名前的缩进表示嵌套导入的深度。
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"): continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[1].strip().isdigit(): continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((name.strip(), depth, int(fields[1])))
+    return times
+
+
+# 每个子命令的 --help 都不能载入重量级模块
+HELP_ARGVS = (["--help"], ["crawl", "--help"], ["import", "--help"],
+              ["export", "--help"], ["migrate", "--help"],
+              ["materialize", "--help"])
+
+
+def startup_time(argv):
+    """ Return total import time of argv, fail on heavy modules. """
+    times = import_times(argv)
+    heavy = [m for m, d, t in times if m.split(".")[0] in HEAVY_MODULES]
+    assert not heavy, "%s imports %s" % (argv, ", ".join(heavy))
+    # 只统计顶层导入, 其累计时间已包含嵌套导入
+    total = sum(t for m, d, t in times if d == 0)
+    assert total <= MAX_IMPORT_US, "%s takes %d us to import" % (argv, total)
+    return total
+
+
+@pytest.mark.parametrize("argv", HELP_ARGVS, ids=" ".join)
+def test_help_startup(argv):
+    """ --help imports no heavy module and starts within budget. """
+    startup_time(argv)
+
+
+def test_tdx_codes_without_lxml():
+    """ import tdx-codes only reads a binary file, lxml is not needed. """
+    # 文件不存在, 命令在导入处理模块之后读取文件时失败
+    times = import_times(["import", "tdx-codes", "上海",
+                          os.path.join("no-such-dir", "shm.tnf")])
+    names = [m for m, d, t in times]
+    assert "etl.tdx" in names
+    assert not [m for m in names if m.split(".")[0] == "lxml"], names
+
+
+#
+# SECTION: SELFTESTING
+#
+#   Selftesing syntax: python <filename>
+#
+if __name__ == "__main__":
+    for argv in HELP_ARGVS:
+        print("%-20s %6d us" % (" ".join(argv), startup_time(argv)))
+    test_tdx_codes_without_lxml()
+    print("test_tdx_codes_without_lxml OK")
@@ -0,0 +1,91 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+""" Used to test cached NumExtData objects """
+
+#
+# SECTION: MODULE IMPORTS
+#
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import data.extended
+from data.extended import CaptitalStructureData, _obj_cache, clear_cache
+
+
+#
+# SECTION: CLASS DEFINATION
+#
+# 代替 MySQL 连接, 记录写入的数据
+class FakeConn:
+    """ Minimal MySQL connection recording executemany calls. """
+
+    def __init__(self):
+        self.rows = []
+        self.commits = 0
+
+    def cursor(self):
+        return self
+
+    def executemany(self, sql, rows):
+        self.rows.extend(rows)
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+def test_cached_and_invalidate(monkeypatch):
+    """ cached() shares one load, a writer's commit evicts it. """
+    loads = []
+
+    def fake_iter(code=None, type_=None, *args, **kw):
+        loads.append((code, type_))
+        yield [["总股本", date(2016, 1, 1), Decimal(100)]]
+
+    conn = FakeConn()
+    monkeypatch.setattr(data.extended, "iter_num_ext_data", fake_iter)
+    monkeypatch.setattr(data.extended.mysql.connector, "connect",
+                        lambda **kw: conn)
+    clear_cache()
+    key = ("600036", CaptitalStructureData.data_type)
+
+    a = CaptitalStructureData.cached("600036")
+    b = CaptitalStructureData.cached("600036")
+    assert a is b and loads == [key]
+    assert key in _obj_cache
+
+    # 写入者使用自己的对象, 提交后缓存中的对象失效
+    writer = CaptitalStructureData("600036")
+    assert writer is not a and len(loads) == 2
+    assert writer.add_one(["总股本", date(2016, 6, 1), Decimal(200)])
+    writer.update_database()
+    assert conn.commits == 1
+    assert conn.rows == [["600036", "股本结构", "总股本", date(2016, 6, 1),
+                          Decimal(200)]]
+    assert key not in _obj_cache
+    assert len(a.data) == 1  # 共享对象没有被写入者修改
+    # 再次提交不应因 insert_idx/update_idx 共用列表而失败
+    writer.update_database()
+
+    c = CaptitalStructureData.cached("600036")
+    assert c is not a and len(loads) == 3
+    clear_cache()
+
+
+#
+# SECTION: SELFTESTING
+#
+#   Selftesing syntax: python <filename>
+#
+if __name__ == "__main__":
+    with pytest.MonkeyPatch.context() as mp:
+        test_cached_and_invalidate(mp)
+    print("test_cached_and_invalidate OK")
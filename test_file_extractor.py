@@ -6,20 +6,12 @@
 #
 # SECTION: MODULE IMPORTS
 #
-from config import *
-from etl.connector import MysqlConn
-from etl.extractor import TdxCodeFile
-
 import platform
 
-#
-# from etl.connector import DBConn
-# from etl.extractor import TdxCodeFile
+import mysql.connector
 
-#
-# SECTION: DEFINE EXTERNAL INTERFACE
-#
-__all__ = ['', ]
+from config import *
+from etl.tdx import TdxCodeFile
 
 #
 # SECTION: SELFTESTING
@@ -34,6 +26,8 @@ if __name__ == "__main__":
         file_path = "E:\Stock\TDX\T0002\hq_cache\shm.tnf"
     else:
         file_path = "/home/mammon/Programming/shm.tnz"
-    sh_code_e = TdxCodeFile("上海", file_path, **confs.DB_STR)
+    sh_code_e = TdxCodeFile("上海", file_path)
     sh_code_e.fetch()
-    sh_code_e.upload()
+    db_conn = mysql.connector.connect(**DB_STR)
+    sh_code_e.upload(db_conn)
+    db_conn.close()
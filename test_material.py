@@ -0,0 +1,119 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+""" Used to test MarketCapStore """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import math
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from struct import pack
+
+import numpy
+
+from data.material import (FLOAT_ITEM, MARKET_SH, MARKET_SZ, TOTAL_ITEM,
+                           MarketCapStore, _ffill, read_tnf_closes)
+
+#
+# SECTION: GLOBAL VAIRABLE DEFINATION
+#
+# 000001 在深圳是平安银行, 在上海是上证指数; 只有平安银行有股本结构数据。
+CAPITAL = [
+    ["000001", TOTAL_ITEM, date(2016, 1, 1), Decimal(100)],
+    ["000001", FLOAT_ITEM, date(2016, 1, 1), Decimal(80)],
+    ["000001", TOTAL_ITEM, date(2016, 6, 1), Decimal(200)],
+    ["600036", TOTAL_ITEM, date(2016, 1, 1), Decimal(50)],
+    ["600036", FLOAT_ITEM, date(2016, 1, 1), Decimal(40)],
+]
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+def write_tnf(path, file_date, records):
+    """ Write a synthetic .tnf file of [(code, close, market), ...]. """
+    with open(path, "wb") as f:
+        f.write(pack("<40shii", b"", 0,
+                     file_date.year * 10000 + file_date.month * 100 +
+                     file_date.day, 0))
+        for code, close, market in records:
+            f.write(pack("<23s49sIBc8sBBB183sBBBBfBI29s",
+                         code.encode("gbk"), "名称".encode("gbk"), 2, 32,
+                         b"A", b"", 0, 0, 0, b"", 0, 0, 0, 0, close,
+                         market, 1, b""))
+
+
+def test_ffill():
+    """ NaN before the first change, forward filled after. """
+    dates = numpy.array(['2016-01-05', '2016-01-10'], dtype='datetime64[D]')
+    values = numpy.array([1.0, 2.0])
+    index = numpy.array(['2016-01-01', '2016-01-05', '2016-01-07',
+                         '2016-01-10', '2016-02-01'], dtype='datetime64[D]')
+    out = _ffill(dates, values, index)
+    assert math.isnan(out[0])
+    assert list(out[1:]) == [1.0, 1.0, 2.0, 2.0]
+    assert math.isnan(_ffill(dates[:0], values[:0], index[:1])[0])
+
+
+def test_build(tmp_path):
+    """ Closes keyed by market, incremental rebuilds. """
+    tmp = str(tmp_path)
+    sh, sz = os.path.join(tmp, "shm.tnf"), os.path.join(tmp, "szm.tnf")
+    write_tnf(sh, date(2016, 8, 12),
+              [("000001", 3000.0, MARKET_SH), ("600036", 17.5, MARKET_SH)])
+    write_tnf(sz, date(2016, 8, 11), [("000001", 9.25, MARKET_SZ)])
+    assert read_tnf_closes(sz) == (date(2016, 8, 11),
+                                   {(MARKET_SZ, "000001"): 9.25})
+
+    store = MarketCapStore(os.path.join(tmp, "store"))
+    # szm.tnf 放在最后也不能让指数价格覆盖平安银行
+    assert store.build([sz, sh], [CAPITAL]) == ["000001", "600036"]
+    s = store.series("000001")
+    assert [str(d) for d in s['date']] == \
+        ["2016-01-01", "2016-06-01", "2016-08-11"]
+    assert s['close'][-1] == 9.25 and s['total'][-1] == 200.0
+    assert s['mcap'][-1] == 1850.0 and s['fmcap'][-1] == 740.0
+    assert math.isnan(s['mcap'][0])
+    assert str(store.series("600036")['date'][-1]) == "2016-08-12"
+    market = store.market()
+    assert list(market['code']) == ["000001", "600036"]
+    assert list(market['mcap']) == [1850.0, 875.0]
+
+    # 稀疏序列在任意日期上向前填充
+    assert store.value_at("000001", date(2016, 8, 20)) == 1850.0
+    assert store.value_at("000001", date(2016, 7, 1), 'total') == 200.0
+    assert store.value_at("000001", date(2016, 3, 1), 'float') == 80.0
+    assert math.isnan(store.value_at("000001", date(2015, 1, 1), 'total'))
+
+    # 输入不变时不重建任何代码, 重新打开存储也一样
+    assert store.build([sh, sz], [CAPITAL]) == []
+    assert MarketCapStore(store.path).build([sh, sz], [CAPITAL]) == []
+
+    # 只有深圳的新收盘价, 只重建深圳的代码, 历史价格被保留
+    write_tnf(sz, date(2016, 8, 12), [("000001", 9.5, MARKET_SZ)])
+    assert store.build([sh, sz], [CAPITAL]) == ["000001"]
+    s = store.series("000001")
+    assert list(s['close'][-2:]) == [9.25, 9.5]
+
+    # 修正非最新一行的日期也必须被发现
+    capital = [r[:] for r in CAPITAL]
+    capital[3][2] = date(2015, 12, 31)
+    assert store.build([sh, sz], [capital]) == ["600036"]
+    assert str(store.series("600036")['date'][0]) == "2015-12-31"
+
+
+#
+# SECTION: SELFTESTING
+#
+#   Selftesing syntax: python <filename>
+#
+if __name__ == "__main__":
+    test_ffill()
+    print("test_ffill               OK")
+    with tempfile.TemporaryDirectory() as tmp:
+        test_build(tmp)
+    print("test_build               OK")
@@ -0,0 +1,130 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+""" Used to test schema migrations and indexes of hot queries """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import sqlite3
+import sys
+
+import pytest
+
+from data.schema import (HOT_QUERIES, MIGRATIONS, check_indexes,
+                         current_version, migrate, partition_by_code)
+
+
+#
+# SECTION: CLASS DEFINATION
+#
+# 代替 MySQL 连接, 返回指定的分区数并记录执行的语句
+class FakeConn:
+    """ Minimal MySQL connection answering the partition count query. """
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.sqls = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, args=()):
+        self.sqls.append(sql)
+
+    def fetchone(self):
+        return (self.partitions,)
+
+    def close(self):
+        pass
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+def _mysql_conn():
+    """ Return MySQL connection of config.DB_STR, skip when unreachable. """
+    import mysql.connector
+    from config import DB_STR
+    try:
+        return mysql.connector.connect(**DB_STR, connection_timeout=3)
+    except mysql.connector.Error as e:
+        pytest.skip("MySQL not available: %s" % e)
+
+
+@pytest.fixture(params=["sqlite", "mysql"])
+def db_conn(request):
+    """ In-memory SQLite database, or MySQL when it is reachable. """
+    conn = sqlite3.connect(":memory:") if request.param == "sqlite" \
+        else _mysql_conn()
+    yield conn
+    conn.close()
+
+
+def test_migrate_idempotent(db_conn):
+    """ Step by step and repeated migrations reach the latest version. """
+    latest = MIGRATIONS[-1][0]
+    if isinstance(db_conn, sqlite3.Connection):
+        assert migrate(db_conn, target=1) == 1
+    assert migrate(db_conn) == latest
+    assert migrate(db_conn) == latest
+    assert current_version(db_conn) == latest
+
+
+def test_hot_queries_use_indexes(db_conn):
+    """ EXPLAIN shows every hot query uses its index. """
+    migrate(db_conn)
+    # SQLite 中热点查询必须只读取覆盖索引
+    if isinstance(db_conn, sqlite3.Connection):
+        cursor = db_conn.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " +
+                       HOT_QUERIES[0][1].replace("%s", "?"),
+                       HOT_QUERIES[0][2])
+        plan = " ".join(r[-1] for r in cursor.fetchall())
+        cursor.close()
+        assert "COVERING INDEX idx_num_ext_code_type" in plan, plan
+    assert check_indexes(db_conn) == []
+
+
+def test_index_missing_detected():
+    """ Without version 2 the code/type query does not use its index. """
+    db_conn = sqlite3.connect(":memory:")
+    migrate(db_conn, target=1)
+    failed = check_indexes(db_conn)
+    db_conn.close()
+    assert [f[0] for f in failed] == [HOT_QUERIES[0][0]]
+
+
+def test_partition_once():
+    """ Partitioning is skipped when the table is already partitioned. """
+    conn = FakeConn(0)
+    assert partition_by_code(conn)
+    assert conn.sqls[-1].startswith("ALTER TABLE num_extend_data")
+    conn = FakeConn(4)
+    assert not partition_by_code(conn)
+    assert not [s for s in conn.sqls if s.startswith("ALTER")]
+    with pytest.raises(ValueError):
+        partition_by_code(sqlite3.connect(":memory:"))
+
+
+#
+# SECTION: SELFTESTING
+#
+#   Selftesing syntax: python <filename> [mysql]
+#
+#   默认在内存中的 SQLite 数据库上检查, 参数为 mysql 时同时检查 config 中的
+#   MySQL 数据库。
+#
+if __name__ == "__main__":
+    kinds = ["sqlite"]
+    if len(sys.argv) > 1 and sys.argv[1] == "mysql": kinds.append("mysql")
+    for kind in kinds:
+        for test in (test_migrate_idempotent, test_hot_queries_use_indexes):
+            db_conn = sqlite3.connect(":memory:") if kind == "sqlite" \
+                else _mysql_conn()
+            test(db_conn)
+            db_conn.close()
+            print("%-32s OK" % ("%s[%s]" % (test.__name__, kind)))
+    for test in (test_index_missing_detected, test_partition_once):
+        test()
+        print("%-32s OK" % test.__name__)
@@ -0,0 +1,95 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+""" Used to test SpecExtractor with local html pages """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import os
+import tempfile
+
+from etl.extractor import ExtractSpec, SpecExtractor
+
+#
+# SECTION: GLOBAL VAIRABLE DEFINATION
+#
+# 与新浪 "股本结构" 页面相同的布局: 带 id 的表格, 无用的表头, 第一行为日期
+SSE_PAGE = """<html><body>
+<table id="con02-1">
+  <thead><tr><th>股本结构</th></tr></thead>
+  <tr><td>变动日期</td><td>2016-06-30</td><td>2015-12-31</td></tr>
+  <tr><td>总股本</td><td>2522000万股</td><td>2500000万股</td></tr>
+  <tr><td>流通A股</td><td>2062900万股</td><td>2060000万股</td></tr>
+  <tr><td>格式不对的行</td></tr>
+</table>
+<table><tr><td>没有 id 的表格</td><td>忽略</td></tr></table>
+</body></html>"""
+
+# 第一行为说明, 第二行为项目名, 第一列为日期
+TRANSPOSED_PAGE = """<html><body>
+<div class="data"><table>
+  <tr><td>单位: 万股</td></tr>
+  <tr><td>日期</td><td>总股本</td><td>流通A股</td></tr>
+  <tr><td>2016-06-30</td><td>100万股</td><td>80万股</td></tr>
+  <tr><td>2015-12-31</td><td>90万股</td><td>70万股</td></tr>
+</table></div>
+</body></html>"""
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+def _extract(spec, page):
+    """ Write page to a gbk file and return data extracted by spec. """
+    fd, path = tempfile.mkstemp(suffix=".htm")
+    with os.fdopen(fd, "wb") as f:
+        f.write(page.encode("gbk"))
+    try:
+        extractor = SpecExtractor(spec, "600036", path)
+        extractor.fetch()
+        return extractor.data
+    finally:
+        os.remove(path)
+
+
+def test_sse_layout():
+    """ Head dropped, rows of wrong width and tables without id ignored. """
+    spec = ExtractSpec("test-sse", "{code}.htm", "股本结构")
+    data = _extract(spec, SSE_PAGE)
+    assert data == [["总股本", "2016-06-30", "2522000万股"],
+                    ["总股本", "2015-12-31", "2500000万股"],
+                    ["流通A股", "2016-06-30", "2062900万股"],
+                    ["流通A股", "2015-12-31", "2060000万股"]], data
+
+
+def test_skip_rows_transpose():
+    """ Leading rows skipped and row titles used as dates. """
+    spec = ExtractSpec("test-transposed", "{code}.htm", "股本结构",
+                       tables="//div[@class='data']/table", drop=(),
+                       skip_rows=1, transpose=True)
+    data = _extract(spec, TRANSPOSED_PAGE)
+    assert data == [["总股本", "2016-06-30", "100万股"],
+                    ["流通A股", "2016-06-30", "80万股"],
+                    ["总股本", "2015-12-31", "90万股"],
+                    ["流通A股", "2015-12-31", "70万股"]], data
+
+
+def test_spec_reuse():
+    """ One spec, compiled once, is applied to many pages. """
+    spec = ExtractSpec("test-sse", "{code}.htm", "股本结构")
+    parser = spec.parser
+    for i in range(3):
+        assert len(_extract(spec, SSE_PAGE)) == 4
+    assert spec.parser is parser
+
+
+#
+# SECTION: SELFTESTING
+#
+#   Selftesing syntax: python <filename>
+#
+if __name__ == "__main__":
+    for test in (test_sse_layout, test_skip_rows_transpose, test_spec_reuse):
+        test()
+        print("%-24s OK" % test.__name__)
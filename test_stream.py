@@ -0,0 +1,168 @@
+#!/usr/local/python/bin/python
+# -*- coding: utf-8 -*-
+#
+""" Used to test streaming reads of num_extend_data """
+
+#
+# SECTION: MODULE IMPORTS
+#
+import math
+import sys
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import data.extended
+from data.extended import _rows_to_array, iter_num_ext_data
+
+#
+# SECTION: GLOBAL VAIRABLE DEFINATION
+#
+# 测试数据使用的代码, 测试结束后删除
+TEST_CODE = "TEST01"
+TEST_ROWS = [
+    (TEST_CODE, "股本结构", "总股本", date(2016, 1, i), Decimal(i))
+    for i in range(1, 5)
+] + [(TEST_CODE, None, "总股本", date(2016, 1, 5), None)]
+
+
+#
+# SECTION: CLASS DEFINATION
+#
+# 代替 MySQL 的非缓冲游标, 记录查询语句和 fetchmany 的调用
+class FakeConn:
+    """ Minimal unbuffered MySQL connection over a list of rows. """
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.sql = self.args = None
+        self.fetches = []
+        self.closed = False
+
+    def cursor(self, buffered=True):
+        assert buffered is False
+        return self
+
+    def execute(self, sql, args):
+        self.sql, self.args = sql, args
+
+    def fetchmany(self, size):
+        self.fetches.append(size)
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+#
+# SECTION: GLOBAL FUNCTION DEFINATION
+#
+@pytest.fixture
+def db_conn():
+    """ MySQL connection of config.DB_STR, skip when unreachable. """
+    import mysql.connector
+    from config import DB_STR
+    try:
+        conn = mysql.connector.connect(**DB_STR, connection_timeout=3)
+    except mysql.connector.Error as e:
+        pytest.skip("MySQL not available: %s" % e)
+    yield conn
+    conn.close()
+
+
+def test_chunks_with_fake_cursor(monkeypatch):
+    """ fetchmany chunking, WHERE clause and close on early exit. """
+    conns = []
+
+    def connect(**kw):
+        conns.append(FakeConn([r[2:] for r in TEST_ROWS]))
+        return conns[-1]
+
+    monkeypatch.setattr(data.extended.mysql.connector, "connect", connect)
+
+    chunks = list(iter_num_ext_data(TEST_CODE, "股本结构", chunk_size=2,
+                                    fields=('item', 'date', 'value')))
+    conn = conns[-1]
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert conn.fetches == [2, 2, 2, 2]
+    assert conn.sql == ("SELECT item, date, value FROM num_extend_data "
+                        "WHERE code = %s AND type = %s")
+    assert conn.args == (TEST_CODE, "股本结构")
+    assert conn.closed
+
+    list(iter_num_ext_data(type_="股本结构", fields=('value',)))
+    assert conns[-1].sql == ("SELECT value FROM num_extend_data "
+                             "WHERE type = %s")
+    list(iter_num_ext_data())
+    assert conns[-1].sql.endswith("FROM num_extend_data")
+    assert conns[-1].args == ()
+
+    # 提前结束迭代时连接被关闭, 剩余数据不再读取
+    gen = iter_num_ext_data(TEST_CODE, chunk_size=1)
+    assert len(next(gen)) == 1
+    assert not conns[-1].closed
+    gen.close()
+    assert conns[-1].closed and conns[-1].fetches == [1]
+
+
+def test_rows_to_array():
+    """ NULL type becomes '' and NULL value becomes NaN. """
+    arr = _rows_to_array([r[1:] for r in TEST_ROWS[-2:]],
+                         ('type', 'item', 'date', 'value'))
+    assert list(arr['type']) == ["股本结构", ""]
+    assert arr['value'][0] == 4.0 and math.isnan(arr['value'][1])
+    assert str(arr['date'][1]) == "2016-01-05"
+
+
+def test_streaming(db_conn):
+    """ Chunks follow chunk_size and early exit releases the connection. """
+    cursor = db_conn.cursor()
+    cursor.executemany("INSERT INTO num_extend_data "
+                       "(code, type, item, date, value) "
+                       "VALUES (%s, %s, %s, %s, %s)", TEST_ROWS)
+    db_conn.commit()
+    try:
+        chunks = list(iter_num_ext_data(TEST_CODE, chunk_size=2))
+        assert [len(c) for c in chunks] == [2, 2, 1]
+        chunks = list(iter_num_ext_data(TEST_CODE, "股本结构", chunk_size=3))
+        assert [len(c) for c in chunks] == [3, 1]
+
+        arrays = list(iter_num_ext_data(TEST_CODE, chunk_size=10,
+                                        fields=('type', 'value'),
+                                        as_array=True))
+        assert sorted(arrays[0]['type']) == [""] + ["股本结构"] * 4
+
+        # 提前结束迭代, 未读数据被丢弃, 之后的读取不受影响
+        gen = iter_num_ext_data(TEST_CODE, chunk_size=1)
+        assert len(next(gen)) == 1
+        gen.close()
+        assert sum(len(c) for c in iter_num_ext_data(TEST_CODE)) == 5
+    finally:
+        cursor.execute("DELETE FROM num_extend_data WHERE code = %s",
+                       (TEST_CODE,))
+        db_conn.commit()
+        cursor.close()
+
+
+#
+# SECTION: SELFTESTING
+#
+#   Selftesing syntax: python <filename> [mysql]
+#
+#   参数为 mysql 时使用 config 中的 MySQL 数据库检查流式读取。
+#
+if __name__ == "__main__":
+    test_rows_to_array()
+    print("test_rows_to_array       OK")
+    with pytest.MonkeyPatch.context() as mp:
+        test_chunks_with_fake_cursor(mp)
+    print("test_chunks_with_fake_cursor OK")
+    if len(sys.argv) > 1 and sys.argv[1] == "mysql":
+        import mysql.connector
+        from config import DB_STR
+        db_conn = mysql.connector.connect(**DB_STR)
+        test_streaming(db_conn)
+        db_conn.close()
+        print("test_streaming           OK")